@@ -15,6 +15,7 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta, date
 from contextlib import asynccontextmanager
+from functools import lru_cache
 import os
 import sys
 
@@ -30,6 +31,7 @@ from database.models import (
     Superinvestor, Filing13F, Holding,
     CongressMember, CongressTrade, NetWorthReport, NetWorthAsset, NetWorthLiability
 )
+from scrapers.sec_13f_scraper import SEC13FScraper
 from sqlalchemy import func, desc, and_
 from sqlalchemy.orm import Session
 
@@ -129,46 +131,39 @@ class InsightsResponse(BaseModel):
 # Refresh window: 10 days before deadline → 5 days after deadline
 # ═══════════════════════════════════════════════════════════════════════════════
 
-# Define refresh windows as (start_month, start_day, end_month, end_day)
+# Define refresh windows as (month, start_day, end_day) - each window lies
+# within a single month
 REFRESH_WINDOWS = [
-    (2, 4, 2, 19),   # Q4 filing: Feb 4-19
-    (5, 5, 5, 20),   # Q1 filing: May 5-20
-    (8, 4, 8, 19),   # Q2 filing: Aug 4-19
-    (11, 4, 11, 19), # Q3 filing: Nov 4-19
+    (2, 4, 19),   # Q4 filing: Feb 4-19
+    (5, 5, 20),   # Q1 filing: May 5-20
+    (8, 4, 19),   # Q2 filing: Aug 4-19
+    (11, 4, 19),  # Q3 filing: Nov 4-19
 ]
+# month -> days of that month inside its window
+REFRESH_DAYS_BY_MONTH = {month: range(start_day, end_day + 1) for month, start_day, end_day in REFRESH_WINDOWS}
 
 scheduler = BackgroundScheduler()
 
-def is_in_refresh_window() -> bool:
-    """Check if today falls within a 13F refresh window."""
-    today = date.today()
-    current_month = today.month
-    current_day = today.day
-    
-    for start_month, start_day, end_month, end_day in REFRESH_WINDOWS:
-        if start_month == end_month:
-            if current_month == start_month and start_day <= current_day <= end_day:
-                return True
-        else:
-            if (current_month == start_month and current_day >= start_day) or \
-               (current_month == end_month and current_day <= end_day):
-                return True
-    
-    return False
+# The answers only change at midnight, so both checks are memoized on the
+# date's ordinal - status polling hits the cache instead of recomputing
+@lru_cache(maxsize=2)
+def _in_refresh_window(day: int) -> bool:
+    today = date.fromordinal(day)
+    return today.day in REFRESH_DAYS_BY_MONTH.get(today.month, ())
 
-def get_next_refresh_window() -> str:
-    """Get info about the next refresh window."""
-    today = date.today()
+@lru_cache(maxsize=2)
+def _next_refresh_window(day: int) -> str:
+    today = date.fromordinal(day)
     current_year = today.year
     
     windows_with_dates = []
-    for start_month, start_day, end_month, end_day in REFRESH_WINDOWS:
-        start_date = date(current_year, start_month, start_day)
-        end_date = date(current_year, end_month, end_day)
+    for month, start_day, end_day in REFRESH_WINDOWS:
+        start_date = date(current_year, month, start_day)
+        end_date = date(current_year, month, end_day)
         
         if end_date < today:
-            start_date = date(current_year + 1, start_month, start_day)
-            end_date = date(current_year + 1, end_month, end_day)
+            start_date = date(current_year + 1, month, start_day)
+            end_date = date(current_year + 1, month, end_day)
         
         windows_with_dates.append((start_date, end_date))
     
@@ -179,6 +174,14 @@ def get_next_refresh_window() -> str:
     
     return "Unknown"
 
+def is_in_refresh_window() -> bool:
+    """Check if today falls within a 13F refresh window."""
+    return _in_refresh_window(date.today().toordinal())
+
+def get_next_refresh_window() -> str:
+    """Get info about the next refresh window."""
+    return _next_refresh_window(date.today().toordinal())
+
 def scheduled_13f_refresh():
     """
     Daily scheduled job that refreshes 13F data if we're in a filing window.
@@ -189,8 +192,6 @@ def scheduled_13f_refresh():
     if is_in_refresh_window():
         print("[Scheduler] ✓ In refresh window - starting 13F data refresh...")
         try:
-            # Import here to avoid circular imports
-            from scrapers.sec_13f_scraper import SEC13FScraper
             scraper = SEC13FScraper(data_dir="./data/13f")
             scraper.scrape_all_superinvestors()
             print("[Scheduler] ✓ 13F refresh completed successfully")
@@ -1,21 +1,58 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import json
+from fastapi.responses import FileResponse, Response
+import hashlib
 import os
 import re
+import sqlite3
+import sys
+import tempfile
+import threading
 import time
+from bisect import insort
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 from datetime import datetime, date
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
+from operator import itemgetter
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+import xml.etree.ElementTree as ET
+try:
+    from lxml import etree
+    XMLSyntaxError = etree.XMLSyntaxError
+except ImportError:
+    # lxml is the fast path; the stdlib parser handles the same documents
+    etree = None
+    XMLSyntaxError = ET.ParseError
 
 # APScheduler for quarterly 13F refresh
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from scrapers.sec_13f_scraper import SUPERINVESTORS, CUSIP_TO_TICKER
+from scrapers.sec_13f_scraper import SUPERINVESTORS, CUSIP_TO_TICKER, SEC_RATE_LIMITER
 
-app = FastAPI(title="InvestorInsight API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the on-disk caches and start the scheduler on startup"""
+    load_cusip_cache()
+    load_cache()
+    start_scheduler()
+    yield
+    stop_scheduler()
+    SESSION.close()
+    close_cache_db()
+
+app = FastAPI(title="InvestorInsight API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,34 +61,139 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Holdings payloads are large, repetitive JSON - compress anything over 1 KB
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# One pooled session for sec.gov and OpenFIGI so repeat calls reuse a kept-alive
+# TLS connection instead of a fresh handshake per request. The pool is sized
+# for the concurrent refresh workers; idempotent requests that hit a transient
+# 429/5xx are retried with backoff (honouring Retry-After).
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+))
+
 # =============================================================================
 # CUSIP TO TICKER LOOKUP SYSTEM (OpenFIGI API)
 # =============================================================================
 # OpenFIGI is a free API that maps CUSIPs to tickers
-# Rate limit: 25 requests/minute, 100 identifiers per request (no API key)
-# With API key: 250 requests/minute
+# Rate limit: 25 requests/minute, 10 identifiers per request (no API key)
+# With API key (OPENFIGI_API_KEY): 25 requests/6 seconds, 100 identifiers per request
 # =============================================================================
 
+OPENFIGI_API_KEY = os.environ.get("OPENFIGI_API_KEY")
+OPENFIGI_BATCH_SIZE = 100 if OPENFIGI_API_KEY else 10
+OPENFIGI_WINDOW_SECONDS = 6 if OPENFIGI_API_KEY else 60
+
+# Send times of the last 25 OpenFIGI requests (monotonic clock). A request
+# only waits when all 25 fall inside the current window, and the lock makes
+# concurrent callers share that one budget.
+_openfigi_calls = deque(maxlen=25)
+_openfigi_lock = threading.Lock()
+
+# Mappings persist in a WAL-mode SQLite table, one row per CUSIP, so saving a
+# handful of new OpenFIGI results is an insert rather than a file rewrite.
+# The 13F cache (see CACHE below) lives in the same database.
+CACHE_DB = "./data/cache.db"
+# Pre-SQLite JSON cache, imported once into an empty table
 CUSIP_CACHE_FILE = "cusip_cache.json"
-CUSIP_CACHE = {}  # In-memory cache: cusip -> {"ticker": "AAPL", "name": "Apple Inc"}
+# In-memory cache keyed by full 9-character CUSIP so share classes of one
+# issuer (GOOG/GOOGL) keep their own tickers
+CUSIP_CACHE = {}  # cusip -> "AAPL"
+CUSIP_NAMES = {}  # cusip -> "Apple Inc", as reported by OpenFIGI
 
-def load_cusip_cache():
-    global CUSIP_CACHE
+def open_cache_db():
+    os.makedirs(os.path.dirname(CACHE_DB), exist_ok=True)
+    conn = sqlite3.connect(CACHE_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS cusip (cusip TEXT PRIMARY KEY, ticker TEXT NOT NULL, name TEXT NOT NULL DEFAULT '')")
+    conn.execute("CREATE TABLE IF NOT EXISTS investor (cik TEXT PRIMARY KEY, detail BLOB NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+    return conn
+
+# One connection is shared by the refresh thread and its workers - writes take
+# _db_lock so two threads never interleave statements inside one transaction.
+# It is opened on first use, so importing the module leaves ./data untouched.
+_db = None
+_db_lock = threading.Lock()
+_db_open_lock = threading.Lock()
+
+def get_db() -> sqlite3.Connection:
+    global _db
+    if _db is None:
+        with _db_open_lock:
+            if _db is None:
+                _db = open_cache_db()
+    return _db
+
+def close_cache_db():
+    global _db
+    with _db_open_lock:
+        if _db is not None:
+            _db.close()
+            _db = None
+
+def _add_cusip_mapping(cusip: str, mapping: dict):
+    # Older caches also stored every mapping under its 6-char issuer prefix - drop those
+    if len(cusip) != 6:
+        CUSIP_CACHE[cusip] = mapping["ticker"]
+        CUSIP_NAMES[cusip] = mapping.get("name", "")
+
+def _import_legacy_cusip_cache():
+    """Load cusip_cache.json (cusip -> {"ticker", "name"}) and copy it into the cusip table"""
     if os.path.exists(CUSIP_CACHE_FILE):
         try:
-            with open(CUSIP_CACHE_FILE, 'r') as f:
-                CUSIP_CACHE = json.load(f)
-            print(f"[CUSIP] Loaded {len(CUSIP_CACHE)} cached mappings")
+            with open(CUSIP_CACHE_FILE, 'rb') as f:
+                data = orjson.loads(f.read())
+            for cusip, mapping in data.items():
+                _add_cusip_mapping(cusip, mapping)
         except:
-            CUSIP_CACHE = {}
+            CUSIP_CACHE.clear()
+            CUSIP_NAMES.clear()
+    if CUSIP_CACHE:
+        save_cusip_cache({cusip: {"ticker": ticker, "name": CUSIP_NAMES[cusip]} for cusip, ticker in CUSIP_CACHE.items()})
+        print(f"[CUSIP] Imported {len(CUSIP_CACHE)} mappings from {CUSIP_CACHE_FILE}")
+
+def load_cusip_cache():
+    rows = get_db().execute("SELECT cusip, ticker, name FROM cusip").fetchall()
+    if not rows:
+        _import_legacy_cusip_cache()
+        return
+    for cusip, ticker, name in rows:
+        CUSIP_CACHE[cusip] = ticker
+        CUSIP_NAMES[cusip] = name
+    print(f"[CUSIP] Loaded {len(CUSIP_CACHE)} cached mappings")
 
-def save_cusip_cache():
+def save_cusip_cache(new_mappings: dict):
+    """Upsert new mappings into the cusip table"""
     try:
-        with open(CUSIP_CACHE_FILE, 'w') as f:
-            json.dump(CUSIP_CACHE, f)
+        with _db_lock, get_db() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO cusip (cusip, ticker, name) VALUES (?, ?, ?)",
+                [(cusip, m["ticker"], m.get("name", "")) for cusip, m in new_mappings.items()],
+            )
     except Exception as e:
         print(f"[CUSIP] Failed to save cache: {e}")
 
+def _openfigi_wait():
+    """Block until another OpenFIGI request fits in the rate-limit window"""
+    with _openfigi_lock:
+        now = time.monotonic()
+        if len(_openfigi_calls) == _openfigi_calls.maxlen:
+            wait = OPENFIGI_WINDOW_SECONDS - (now - _openfigi_calls[0])
+            if wait > 0:
+                time.sleep(wait)
+                now = time.monotonic()
+        _openfigi_calls.append(now)
+
+def _openfigi_backoff():
+    """After a 429, treat the window as used up so the next request waits it out"""
+    with _openfigi_lock:
+        _openfigi_calls.extend([time.monotonic()] * _openfigi_calls.maxlen)
+
 def lookup_cusips_openfigi(cusips: list) -> dict:
     """
     Batch lookup CUSIPs via OpenFIGI API.
@@ -60,20 +202,22 @@ def lookup_cusips_openfigi(cusips: list) -> dict:
     if not cusips:
         return {}
     
-    # OpenFIGI has undocumented size limits - use small batches
-    BATCH_SIZE = 10
+    headers = {"Content-Type": "application/json"}
+    if OPENFIGI_API_KEY:
+        headers["X-OPENFIGI-APIKEY"] = OPENFIGI_API_KEY
     results = {}
     
-    for i in range(0, len(cusips), BATCH_SIZE):
-        batch = cusips[i:i+BATCH_SIZE]
+    for i in range(0, len(cusips), OPENFIGI_BATCH_SIZE):
+        batch = cusips[i:i+OPENFIGI_BATCH_SIZE]
         
         # Build request payload
         payload = [{"idType": "ID_CUSIP", "idValue": c} for c in batch]
         
         try:
-            r = requests.post(
+            _openfigi_wait()
+            r = SESSION.post(
                 "https://api.openfigi.com/v3/mapping",
-                headers={"Content-Type": "application/json"},
+                headers=headers,
                 json=payload,
                 timeout=10
             )
@@ -88,91 +232,111 @@ def lookup_cusips_openfigi(cusips: list) -> dict:
                         name = figi_data.get("name", "")
                         if ticker:
                             results[cusip] = {"ticker": ticker, "name": name}
-                            # Also cache by 6-char prefix for flexibility
-                            results[cusip[:6]] = {"ticker": ticker, "name": name}
             elif r.status_code == 429:
-                print("[CUSIP] Rate limited by OpenFIGI, waiting 60s...")
-                time.sleep(60)
+                print("[CUSIP] Rate limited by OpenFIGI, backing off for the rest of the window...")
+                _openfigi_backoff()
             elif r.status_code == 413:
-                # Payload too large - this shouldn't happen with batch size of 10
+                # Payload too large - this shouldn't happen within OPENFIGI_BATCH_SIZE
                 print(f"[CUSIP] Batch too large ({len(batch)}), skipping")
             else:
                 print(f"[CUSIP] OpenFIGI error: {r.status_code}")
-                
-            # Respect rate limits - small delay between batches
-            time.sleep(0.3)
             
         except Exception as e:
             print(f"[CUSIP] OpenFIGI lookup failed: {e}")
     
     return results
 
-def get_ticker_for_cusip(cusip: str, issuer_name: str = "") -> str:
+def get_tickers_for_cusips(cusips: list) -> list:
     """
-    Get ticker for a CUSIP. Checks in order:
+    Get tickers for a filing's CUSIPs. Checks in order:
     1. In-memory cache
     2. Hardcoded mappings
     3. Returns CUSIP prefix if not found (will be resolved in batch later)
     """
-    cusip_6 = cusip[:6]
-    
-    # Check cache first
-    if cusip in CUSIP_CACHE:
-        return CUSIP_CACHE[cusip].get("ticker", cusip_6)
-    if cusip_6 in CUSIP_CACHE:
-        return CUSIP_CACHE[cusip_6].get("ticker", cusip_6)
-    
-    # Check hardcoded mappings
-    if cusip_6 in CUSIP_TO_TICKER:
-        return CUSIP_TO_TICKER[cusip_6]
+    # One C-level map over the cache; only misses fall back to the prefix table
+    tickers = list(map(CUSIP_CACHE.get, cusips))
+    for i, ticker in enumerate(tickers):
+        if not ticker:
+            cusip_6 = cusips[i][:6]
+            tickers[i] = CUSIP_TO_TICKER.get(cusip_6, cusip_6)
+    return tickers
+
+_DIGITS = frozenset("0123456789")
+_cusip_lock = threading.Lock()
+
+# Most unknown CUSIPs one full refresh sends to OpenFIGI - about a minute of
+# the keyless quota (25 requests x 10 identifiers)
+OPENFIGI_REFRESH_LIMIT = 250
+
+def is_unresolved_ticker(ticker: str) -> bool:
+    # A ticker that looks like a CUSIP prefix (6 chars, has numbers) is unresolved
+    return len(ticker) == 6 and not _DIGITS.isdisjoint(ticker)
+
+def _lookup_and_store(unknown_cusips: set):
+    """Resolve CUSIPs via OpenFIGI and record the results in CUSIP_CACHE and the cusip table"""
+    if not unknown_cusips:
+        return
+    print(f"[CUSIP] Looking up {len(unknown_cusips)} unknown CUSIPs via OpenFIGI...")
+    new_mappings = lookup_cusips_openfigi(list(unknown_cusips))
     
-    # Return prefix - will be resolved later
-    return cusip_6
+    if new_mappings:
+        for cusip, mapping in new_mappings.items():
+            _add_cusip_mapping(cusip, mapping)
+        save_cusip_cache(new_mappings)
+        print(f"[CUSIP] Resolved {len(new_mappings)} new mappings")
 
-def resolve_unknown_cusips(holdings: list) -> list:
+def resolve_unknown_cusips(cusips: list, tickers: list) -> list:
     """
-    Take a list of holdings with potentially unknown CUSIPs and resolve them via OpenFIGI.
-    Updates the CUSIP_CACHE and returns updated holdings.
+    Take parallel lists of CUSIPs and tickers, some possibly unresolved, and resolve them via OpenFIGI.
+    Updates the CUSIP_CACHE and returns the updated tickers list.
     Limits lookups to avoid rate limiting.
     """
-    # Find CUSIPs we don't know - deduplicate by 6-char prefix
-    unknown_cusips = {}
-    for h in holdings:
-        ticker = h.get("ticker", "")
-        # If ticker looks like a CUSIP (6 chars, has numbers), it's unresolved
-        if len(ticker) == 6 and any(c.isdigit() for c in ticker):
-            cusip = h.get("cusip", ticker)
-            cusip_6 = cusip[:6]
-            # Check both full and prefix in cache
-            if cusip not in CUSIP_CACHE and cusip_6 not in CUSIP_CACHE:
-                unknown_cusips[cusip_6] = cusip  # Dedupe by prefix
-    
-    # Limit to 50 lookups per call to avoid rate limiting
-    unknown_list = list(unknown_cusips.values())[:50]
-    
-    if unknown_list:
-        print(f"[CUSIP] Looking up {len(unknown_list)} unknown CUSIPs via OpenFIGI...")
-        new_mappings = lookup_cusips_openfigi(unknown_list)
-        
-        if new_mappings:
-            CUSIP_CACHE.update(new_mappings)
-            save_cusip_cache()
-            print(f"[CUSIP] Resolved {len(new_mappings)} new mappings")
+    # One lookup at a time so concurrent callers holding the same unknown
+    # CUSIP don't both send it to OpenFIGI
+    with _cusip_lock:
+        # Find CUSIPs we don't know, stopping once there are 50 to look up
+        # (limit per call to avoid rate limiting)
+        unknown_cusips = set()
+        for cusip, ticker in zip(cusips, tickers):
+            if is_unresolved_ticker(ticker) and cusip not in CUSIP_CACHE:
+                unknown_cusips.add(cusip)
+                if len(unknown_cusips) == 50:
+                    break
+        _lookup_and_store(unknown_cusips)
     
-    # Update holdings with resolved tickers (from cache)
-    for h in holdings:
-        ticker = h.get("ticker", "")
-        if len(ticker) == 6 and any(c.isdigit() for c in ticker):
-            cusip = h.get("cusip", ticker)
-            if cusip in CUSIP_CACHE:
-                h["ticker"] = CUSIP_CACHE[cusip]["ticker"]
-            elif cusip[:6] in CUSIP_CACHE:
-                h["ticker"] = CUSIP_CACHE[cusip[:6]]["ticker"]
+    # Update tickers with resolved values (from cache)
+    for i, (cusip, ticker) in enumerate(zip(cusips, tickers)):
+        if is_unresolved_ticker(ticker):
+            tickers[i] = CUSIP_CACHE.get(cusip, ticker)
     
-    return holdings
+    return tickers
 
-# Load CUSIP cache on startup
-load_cusip_cache()
+def resolve_refreshed_tickers(ciks: list):
+    """
+    After a full refresh, resolve the unknown CUSIPs of every refreshed investor
+    in one OpenFIGI pass (full batches, each CUSIP once) and patch their holdings.
+    """
+    with _cusip_lock:
+        unknown_cusips = set()
+        for cik in ciks:
+            for h in CACHE["details"][cik]["holdings"]:
+                if is_unresolved_ticker(h["ticker"]) and h["cusip"] not in CUSIP_CACHE:
+                    unknown_cusips.add(h["cusip"])
+            if len(unknown_cusips) >= OPENFIGI_REFRESH_LIMIT:
+                break
+        _lookup_and_store(set(islice(unknown_cusips, OPENFIGI_REFRESH_LIMIT)))
+    
+    # Copy-on-write: readers may be serializing the published detail, so a
+    # patched copy is built and swapped in rather than editing it in place
+    for cik in ciks:
+        detail = CACHE["details"][cik]
+        holdings = [
+            {**h, "ticker": CUSIP_CACHE[h["cusip"]]}
+            if is_unresolved_ticker(h["ticker"]) and h["cusip"] in CUSIP_CACHE else h
+            for h in detail["holdings"]
+        ]
+        if any(new is not old for new, old in zip(holdings, detail["holdings"])):
+            set_investor_detail(cik, {**detail, "holdings": holdings})
 
 # =============================================================================
 # QUARTERLY 13F REFRESH SCHEDULER
@@ -185,35 +349,43 @@ load_cusip_cache()
 # =============================================================================
 
 REFRESH_WINDOWS = [
-    (2, 4, 2, 19),   # Q4 filing: Feb 4-19
-    (5, 5, 5, 20),   # Q1 filing: May 5-20
-    (8, 4, 8, 19),   # Q2 filing: Aug 4-19
-    (11, 4, 11, 19), # Q3 filing: Nov 4-19
+    (2, 4, 19),   # Q4 filing: Feb 4-19
+    (5, 5, 20),   # Q1 filing: May 5-20
+    (8, 4, 19),   # Q2 filing: Aug 4-19
+    (11, 4, 19),  # Q3 filing: Nov 4-19
 ]
+# month -> days of that month inside its window
+REFRESH_DAYS_BY_MONTH = {month: range(start_day, end_day + 1) for month, start_day, end_day in REFRESH_WINDOWS}
 
 scheduler = BackgroundScheduler()
 
-def is_in_refresh_window() -> bool:
-    today = date.today()
-    for start_month, start_day, end_month, end_day in REFRESH_WINDOWS:
-        if start_month == end_month:
-            if today.month == start_month and start_day <= today.day <= end_day:
-                return True
-    return False
+# Both answers only change when the date does, so they are computed once per
+# day (keyed by date ordinal) however often /api/scheduler is hit
+@lru_cache(maxsize=2)
+def _in_refresh_window(day: int) -> bool:
+    today = date.fromordinal(day)
+    return today.day in REFRESH_DAYS_BY_MONTH.get(today.month, ())
 
-def get_next_refresh_window() -> str:
-    today = date.today()
+@lru_cache(maxsize=2)
+def _next_refresh_window(day: int) -> str:
+    today = date.fromordinal(day)
     current_year = today.year
-    for start_month, start_day, end_month, end_day in REFRESH_WINDOWS:
-        start_date = date(current_year, start_month, start_day)
-        end_date = date(current_year, end_month, end_day)
+    for month, start_day, end_day in REFRESH_WINDOWS:
+        start_date = date(current_year, month, start_day)
+        end_date = date(current_year, month, end_day)
         if end_date < today:
-            start_date = date(current_year + 1, start_month, start_day)
-            end_date = date(current_year + 1, end_month, end_day)
+            start_date = date(current_year + 1, month, start_day)
+            end_date = date(current_year + 1, month, end_day)
         if start_date >= today or (start_date <= today <= end_date):
             return f"{start_date.strftime('%b %d')} - {end_date.strftime('%b %d, %Y')}"
     return "Unknown"
 
+def is_in_refresh_window() -> bool:
+    return _in_refresh_window(date.today().toordinal())
+
+def get_next_refresh_window() -> str:
+    return _next_refresh_window(date.today().toordinal())
+
 def scheduled_13f_refresh():
     print(f"[Scheduler] Checking refresh window... ({datetime.now()})")
     if is_in_refresh_window():
@@ -223,7 +395,6 @@ def scheduled_13f_refresh():
     else:
         print(f"[Scheduler] Not in window. Next: {get_next_refresh_window()}")
 
-@app.on_event("startup")
 def start_scheduler():
     scheduler.add_job(
         scheduled_13f_refresh,
@@ -237,32 +408,449 @@ def start_scheduler():
     print(f"[Scheduler] In refresh window: {is_in_refresh_window()}")
     print(f"[Scheduler] Next window: {get_next_refresh_window()}")
 
-@app.on_event("shutdown")
 def stop_scheduler():
     scheduler.shutdown(wait=False)
     print("[Scheduler] Stopped")
 
+# Persisted in CACHE_DB: one investor row per CIK holding its orjson-encoded
+# detail, plus a meta row per CACHE_META_KEYS entry. The summary list is
+# rebuilt from the details on load. cache.json is the pre-SQLite format,
+# imported once into an empty database.
 CACHE_FILE = "./data/cache.json"
+CACHE_META_KEYS = ("last_updated", "refresh_status", "refresh_progress", "failed")
 CACHE = {"investors": [], "details": {}, "last_updated": None, "refresh_status": "idle", "refresh_progress": 0, "failed": []}
 
+# Pre-encoded (body, ETag) pairs for the two hot read endpoints, kept in step
+# with CACHE by set_investors / set_investor_detail so a GET is a plain bytes
+# write, or a bodiless 304 when the client already holds that version
+CACHE_BYTES = {"investors": (b"[]", '"0"'), "details": {}}
+
+# Freshness bounds for the cached 13F data (stale-while-revalidate).
+# Past the soft TTL reads still serve the cached data but start a background
+# refresh; past the hard TTL the data is also reported as stale in /health.
+# A full refresh takes minutes, so reads never wait on it.
+CACHE_SOFT_TTL = 3600
+CACHE_TTL_SECONDS = 6 * 3600
+
+# Browsers/CDNs may reuse a superinvestor response for a few minutes and keep
+# serving it while they revalidate, mirroring the server-side soft TTL
+CACHE_CONTROL = f"public, max-age=300, stale-while-revalidate={CACHE_SOFT_TTL}"
+
+# Concurrent scrapes during a full refresh
+REFRESH_WORKERS = 8
+
+# A running refresh republishes the summary list and saves its progress after
+# this many investors or seconds, whichever comes first
+CHECKPOINT_EVERY = 50
+CHECKPOINT_SECONDS = 30
+
+# Held for the duration of a full refresh so the scheduler, /api/refresh and
+# stale reads never start two scrapes at once
+_refresh_lock = threading.Lock()
+# time.monotonic() when the last full refresh began. A failed refresh leaves
+# last_updated untouched, so stale reads back off on this instead of starting
+# another full SEC (and OpenFIGI) pass on every request.
+_last_refresh_attempt = float("-inf")
+
 HEADERS = {
     "User-Agent": "InvestorInsight Research Bot (contact@investorinsight.com)",
-    "Accept-Encoding": "gzip, deflate",
+    # gzip/deflate, plus br when the brotli package is installed - only
+    # encodings urllib3 can actually decode are advertised
+    "Accept-Encoding": DEFAULT_ACCEPT_ENCODING,
     "Accept": "application/json, text/html, application/xml"
 }
 
+# 13F information table field pattern, compiled once and matched against the raw
+# response bytes. Tags may carry a namespace prefix (ns1:infoTable).
+_INFOTABLE_FIELD_RE = re.compile(
+    rb'<(?:\w+:)?(?P<tag>cusip|nameOfIssuer|value|sshPrnamt|putCall)>(?P<text>[^<]*)</'
+    rb'|</(?:\w+:)?infoTable>',
+    re.IGNORECASE,
+)
+
+def find_infotable_xml(index_data: dict):
+    """Pick the information table XML out of a filing's index.json listing"""
+    names = [item.get("name", "") for item in index_data.get("directory", {}).get("item", [])]
+    xml_names = [n for n in names if n.lower().endswith(".xml") and "primary_doc" not in n.lower()]
+    return next((n for n in xml_names if "infotable" in n.lower()), xml_names[0] if xml_names else None)
+
+def normalize_cusip(cusip: str) -> str:
+    # Canonical upper-case form, interned so a CUSIP held by many investors
+    # is one shared string across every cached detail
+    return sys.intern(cusip.strip().upper())
+
+def _infotable_row(elem) -> tuple:
+    # {*} matches the tags with or without a namespace prefix (lxml and ElementTree alike)
+    cusip = elem.findtext('{*}cusip')
+    return (
+        normalize_cusip(cusip) if cusip else None,
+        elem.findtext('{*}nameOfIssuer') or "",
+        int(elem.findtext('{*}value') or 0),
+        int(elem.findtext('.//{*}sshPrnamt') or 0),
+        elem.findtext('{*}putCall'),
+    )
+
+def iter_infotable_lxml(xml: bytes):
+    """
+    Stream the 13F information table with lxml, yielding one
+    (cusip, name, value, shares, put_call) tuple per infoTable element.
+    cusip is None when the row has none.
+    """
+    for _, elem in etree.iterparse(BytesIO(xml), tag='{*}infoTable'):
+        yield _infotable_row(elem)
+        # Drop the parsed row (and already-visited siblings) to keep memory flat
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+def iter_infotable_etree(xml: bytes):
+    """Same rows as iter_infotable_lxml, streamed by the stdlib parser when lxml isn't installed"""
+    for _, elem in ET.iterparse(BytesIO(xml)):
+        if elem.tag.rpartition('}')[2] == 'infoTable':
+            yield _infotable_row(elem)
+            elem.clear()
+
+iter_infotable = iter_infotable_lxml if etree is not None else iter_infotable_etree
+XML_PARSER = "lxml" if etree is not None else "etree"
+
+def parse_infotable_xml(xml: bytes) -> list:
+    """Returns a list of (cusip, name, value, shares, put_call) tuples for rows with a CUSIP"""
+    return [row for row in iter_infotable(xml) if row[0]]
+
+def parse_infotable_regex(xml: bytes) -> list:
+    """
+    Regex fallback for information tables the XML parser rejects as malformed.
+    One pass over the document picks up each row's fields in whatever order
+    they appear and emits the row at its closing infoTable tag.
+    """
+    rows = []
+    fields = {}
+    for m in _INFOTABLE_FIELD_RE.finditer(xml):
+        tag = m.group("tag")
+        if tag is not None:
+            # First occurrence wins, as with a per-row search
+            fields.setdefault(tag.lower(), m.group("text"))
+            continue
+        
+        cusip = fields.get(b"cusip")
+        if cusip:
+            name = fields.get(b"nameofissuer")
+            value = fields.get(b"value")
+            shares = fields.get(b"sshprnamt", b"").strip()
+            put_call = fields.get(b"putcall")
+            rows.append((
+                normalize_cusip(cusip.decode()),
+                name.decode(errors="replace") if name else "",
+                int(value) if value else 0,
+                int(shares) if shares.isdigit() else 0,
+                put_call.decode() if put_call else None,
+            ))
+        fields = {}
+    return rows
+
+def parse_infotable(xml: bytes) -> list:
+    try:
+        rows = parse_infotable_xml(xml)
+    except XMLSyntaxError:
+        rows = []
+    return rows or parse_infotable_regex(xml)
+
+# =============================================================================
+# SEC RESPONSE CACHE
+# =============================================================================
+# Filing archives (index.json, information table XML) never change once an
+# accession is published, so they are served from disk after the first fetch.
+# Everything else (submissions JSON) is revalidated with ETag/Last-Modified.
+# =============================================================================
+
+HTTP_CACHE_DIR = "./data/http_cache"
+# Entries not written or reused for this long are pruned after a full refresh.
+# Archive XML is rarely read again once its parsed detail is cached, so without
+# this the directory would keep every filing ever fetched.
+HTTP_CACHE_MAX_AGE = 90 * 86400
+
+# A revalidated response is reused without asking SEC again for this long, so
+# repeated debug calls (or a debug call during a refresh) share one fetch
+SEC_FRESH_SECONDS = 60
+_validated_at = {}  # url -> time.monotonic() of the last 200/304
+
+def _read_cached_body(path: str):
+    try:
+        with open(path + ".body", 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _touch(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _atomic_write(path: str, data: bytes):
+    # A private temp file per write - concurrent fetches of one URL each
+    # replace the target whole instead of interleaving into a shared .tmp
+    fd, tmp = tempfile.mkstemp(dir=HTTP_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def _write_cached_response(path: str, url: str, r):
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    _atomic_write(path + ".body", r.content)
+    # Metadata goes last so its presence implies a complete body on disk
+    _atomic_write(path + ".json", orjson.dumps({
+        "url": url,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    }))
+
+def prune_http_cache():
+    """Delete cached responses (and stray temp files) older than HTTP_CACHE_MAX_AGE"""
+    cutoff = time.time() - HTTP_CACHE_MAX_AGE
+    try:
+        entries = list(os.scandir(HTTP_CACHE_DIR))
+    except FileNotFoundError:
+        return
+    removed = 0
+    for entry in entries:
+        # A body's age is tracked by its metadata file and goes with it
+        if entry.name.endswith(".body") and os.path.exists(entry.path[:-5] + ".json"):
+            continue
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            os.remove(entry.path)
+            if entry.name.endswith(".json"):
+                os.remove(entry.path[:-5] + ".body")
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        print(f"[HTTP] Pruned {removed} cached responses")
+
+# URL -> Future of the SEC fetch currently in flight for it
+_inflight_fetches = {}
+_inflight_lock = threading.Lock()
+
+def fetch_sec(url: str, immutable: bool = False):
+    """
+    GET a SEC URL through the on-disk response cache.
+    Returns (status_code, body_bytes). A 304 is returned as 200 with the cached body.
+    
+    Concurrent callers for the same URL - e.g. /api/debug/scrape or
+    /api/debug/refresh while a full refresh fetches that investor - share one
+    request instead of each spending SEC rate-limit budget on it.
+    """
+    with _inflight_lock:
+        future = _inflight_fetches.get(url)
+        leader = future is None
+        if leader:
+            future = _inflight_fetches[url] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = _fetch_sec(url, immutable)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight_fetches[url]
+
+def _fetch_sec(url: str, immutable: bool):
+    path = os.path.join(HTTP_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest())
+    meta = {}
+    if os.path.exists(path + ".json"):
+        try:
+            with open(path + ".json", 'rb') as f:
+                meta = orjson.loads(f.read())
+        except orjson.JSONDecodeError:
+            meta = {}
+    
+    fresh = time.monotonic() - _validated_at.get(url, float("-inf")) < SEC_FRESH_SECONDS
+    if meta and (immutable or fresh):
+        body = _read_cached_body(path)
+        if body is not None:
+            _touch(path + ".json")
+            return 200, body
+    
+    headers = dict(HEADERS)
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    
+    SEC_RATE_LIMITER.acquire()
+    r = SESSION.get(url, headers=headers, timeout=8)
+    if r.status_code == 304:
+        body = _read_cached_body(path)
+        if body is not None:
+            _touch(path + ".json")
+            _validated_at[url] = time.monotonic()
+            return 200, body
+        # Cache entry vanished underneath us - fetch unconditionally
+        SEC_RATE_LIMITER.acquire()
+        r = SESSION.get(url, headers=HEADERS, timeout=8)
+    
+    if r.status_code == 200:
+        try:
+            _write_cached_response(path, url, r)
+            _validated_at[url] = time.monotonic()
+        except OSError as e:
+            print(f"[HTTP] Failed to cache {url}: {e}")
+    return r.status_code, r.content
+
+_13F_FORMS = frozenset({"13F-HR", "13F-HR/A"})
+
+def _first_13f(filings: dict):
+    forms = filings.get("form", [])
+    idx = next((i for i, f in enumerate(forms) if f in _13F_FORMS), None)
+    if idx is None:
+        return None
+    return filings["accessionNumber"][idx], filings["filingDate"][idx]
+
+def find_latest_13f(submissions: dict):
+    """
+    Find the most recent 13F-HR(/A) in a submissions JSON.
+    Returns (accession_number, filing_date) or None.
+    SEC lists filings newest first, so the scan stops at the first match; the
+    older submission pages are only fetched when "recent" has no 13F at all.
+    """
+    filings = submissions.get("filings", {})
+    found = _first_13f(filings.get("recent", {}))
+    if found:
+        return found
+    for page in filings.get("files", []):
+        status, body = fetch_sec(f"https://data.sec.gov/submissions/{page['name']}")
+        if status != 200:
+            break
+        found = _first_13f(orjson.loads(body))
+        if found:
+            return found
+    return None
+
+def _import_legacy_cache():
+    """Copy a pre-SQLite cache.json into the investor and meta tables"""
+    with open(CACHE_FILE, 'rb') as f:
+        data = orjson.loads(f.read())
+    CACHE.update(data)
+    CACHE_BYTES["details"] = {cik: encode_payload(d) for cik, d in CACHE["details"].items()}
+    with _db_lock, get_db() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO investor (cik, detail) VALUES (?, ?)",
+            [(cik, payload[0]) for cik, payload in CACHE_BYTES["details"].items()],
+        )
+    set_investors(CACHE["investors"])
+    save_cache()
+    print(f"[Cache] Imported {len(CACHE['details'])} investors from {CACHE_FILE}")
+
 def load_cache():
-    global CACHE
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r') as f:
-            CACHE = json.load(f)
+    """Load CACHE and warm CACHE_BYTES from the database"""
+    db = get_db()
+    rows = db.execute("SELECT cik, detail FROM investor").fetchall()
+    if rows:
+        CACHE["details"] = {cik: orjson.loads(detail) for cik, detail in rows}
+        # The stored rows are already the orjson bodies the detail endpoint
+        # serves - reuse them rather than re-encoding every investor
+        CACHE_BYTES["details"] = {cik: (detail, etag_for(detail)) for cik, detail in rows}
+        for key, value in db.execute("SELECT key, value FROM meta"):
+            CACHE[key] = orjson.loads(value)
+        set_investors(build_investor_summaries())
+    elif os.path.exists(CACHE_FILE):
+        _import_legacy_cache()
+    # A refresh can't be running in a fresh process - clear a status left
+    # behind by a restart mid-refresh so stale reads can trigger a new one
+    if CACHE.get("refresh_status") == "running":
+        CACHE["refresh_status"] = "interrupted"
+
+def etag_for(body: bytes) -> str:
+    """
+    ETag derived from a response body's content. Weak, because GZipMiddleware
+    sends the same tag on both the gzip and the identity encoding.
+    """
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+def encode_payload(obj) -> tuple:
+    body = orjson.dumps(obj)
+    return body, etag_for(body)
+
+def set_investors(investors: list):
+    CACHE["investors"] = investors
+    CACHE_BYTES["investors"] = encode_payload(investors)
+
+def set_investor_detail(cik: str, detail: dict):
+    """Store one investor's detail in memory and commit its row straight away"""
+    payload = encode_payload(detail)
+    CACHE["details"][cik] = detail
+    CACHE_BYTES["details"][cik] = payload
+    with _db_lock, get_db() as db:
+        db.execute("INSERT OR REPLACE INTO investor (cik, detail) VALUES (?, ?)", (cik, payload[0]))
 
 def save_cache():
-    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(CACHE, f)
+    """Persist refresh status/progress - investor details are written as they arrive"""
+    with _db_lock, get_db() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, orjson.dumps(CACHE[key])) for key in CACHE_META_KEYS],
+        )
+
+def get_cache_age():
+    """Seconds since the last completed refresh, or None if never refreshed"""
+    last_updated = CACHE.get("last_updated")
+    if not last_updated:
+        return None
+    return (datetime.now() - datetime.fromisoformat(last_updated)).total_seconds()
 
-load_cache()
+def is_cache_stale() -> bool:
+    age = get_cache_age()
+    return age is None or age >= CACHE_TTL_SECONDS
+
+def start_refresh(background_tasks: BackgroundTasks) -> bool:
+    """
+    Schedule a full refresh unless one is already running. _refresh_lock is
+    the only gate: a task scheduled before the lock is taken finds it held in
+    do_full_refresh and returns, and refresh_status is set by the refresh itself.
+    """
+    if _refresh_lock.locked():
+        return False
+    background_tasks.add_task(do_full_refresh)
+    return True
+
+def revalidate_if_stale(background_tasks: BackgroundTasks):
+    """Start a background refresh once the cache is past its soft TTL"""
+    if time.monotonic() - _last_refresh_attempt < CACHE_SOFT_TTL:
+        return
+    age = get_cache_age()
+    if age is None or age >= CACHE_SOFT_TTL:
+        start_refresh(background_tasks)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check: weak comparison against each listed tag, * matches any"""
+    if not if_none_match:
+        return False
+    tag = etag.removeprefix("W/")
+    return any(
+        candidate == "*" or candidate.removeprefix("W/") == tag
+        for candidate in (c.strip() for c in if_none_match.split(","))
+    )
+
+def cached_json_response(request: Request, payload: tuple) -> Response:
+    """Serve a pre-encoded payload, or 304 if the client's copy is current"""
+    body, etag = payload
+    headers = {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/")
 def root():
@@ -275,21 +863,25 @@ def health():
     return {
         "status": "healthy",
         "last_updated": CACHE.get("last_updated"),
+        "stale": is_cache_stale(),
         "cached_investors": len(CACHE.get("investors", [])),
         "refresh_status": CACHE.get("refresh_status", "idle"),
         "refresh_progress": CACHE.get("refresh_progress", 0)
     }
 
 @app.get("/api/superinvestors")
-def get_superinvestors():
+def get_superinvestors(request: Request, background_tasks: BackgroundTasks):
+    revalidate_if_stale(background_tasks)
     if CACHE["investors"]:
-        return CACHE["investors"]
-    return {"error": "No data cached. Call /api/refresh first."}
+        return cached_json_response(request, CACHE_BYTES["investors"])
+    return {"error": "No data cached yet. A refresh is running - check /api/status for progress."}
 
 @app.get("/api/superinvestors/{cik}")
-def get_superinvestor(cik: str):
-    if cik in CACHE["details"]:
-        return CACHE["details"][cik]
+def get_superinvestor(cik: str, request: Request, background_tasks: BackgroundTasks):
+    revalidate_if_stale(background_tasks)
+    payload = CACHE_BYTES["details"].get(cik)
+    if payload:
+        return cached_json_response(request, payload)
     return {"error": "Not found"}
 
 @app.get("/api/debug")
@@ -314,97 +906,118 @@ def get_status():
         "refresh_progress": CACHE.get("refresh_progress", 0),
         "cached_investors": len(CACHE.get("investors", [])),
         "failed_count": len(CACHE.get("failed", [])),
-        "last_updated": CACHE.get("last_updated")
+        "last_updated": CACHE.get("last_updated"),
+        "stale": is_cache_stale()
     }
 
-def scrape_one(cik: str, info: dict):
+def scrape_one(cik: str, info: dict, resolve_cusips: bool = True, force: bool = False):
+    """
+    Scrape one investor's latest 13F. force re-parses the filing even when
+    the cached detail already holds its accession.
+    """
+    investor_name, firm = info["name"], info["firm"]
+    subs_url = f"https://data.sec.gov/submissions/CIK{cik.zfill(10)}.json"
     try:
-        cik_padded = cik.zfill(10)
-        time.sleep(0.12)
-        r = requests.get(f"https://data.sec.gov/submissions/CIK{cik_padded}.json", headers=HEADERS, timeout=8)
-        if r.status_code != 200:
+        status, body = fetch_sec(subs_url)
+        if status != 200:
             return None, "CIK not found"
-        data = r.json()
-        recent = data.get("filings", {}).get("recent", {})
-        if not recent:
-            return None, "No recent filings"
-        
-        forms = recent.get("form", [])
-        accessions = recent.get("accessionNumber", [])
-        dates = recent.get("filingDate", [])
-        
-        idx = next((i for i, f in enumerate(forms) if f in ["13F-HR", "13F-HR/A"]), None)
-        if idx is None:
+        latest = find_latest_13f(orjson.loads(body))
+        if latest is None:
             return None, "No 13F-HR filing"
+        accession, filing_date = latest
         
-        acc = accessions[idx].replace("-", "")
+        # Nothing new filed since the last scrape - the cached detail already
+        # reflects this accession, so skip the index/XML read and re-parse
+        cached = CACHE["details"].get(cik)
+        if not force and cached and cached.get("accession") == accession:
+            return cached, None
+        
+        acc = accession.replace("-", "")
         index_url = f"https://www.sec.gov/Archives/edgar/data/{cik}/{acc}/"
         
-        time.sleep(0.12)
-        r = requests.get(index_url, headers=HEADERS, timeout=8)
-        matches = re.findall(r'href="([^"]*infotable[^"]*\.xml)"', r.text, re.IGNORECASE)
-        if not matches:
-            matches = [x for x in re.findall(r'href="([^"]+\.xml)"', r.text, re.IGNORECASE) if 'primary_doc' not in x.lower()]
-        if not matches:
+        status, body = fetch_sec(f"{index_url}index.json", immutable=True)
+        if status != 200:
+            return None, "Filing index not found"
+        xml_name = find_infotable_xml(orjson.loads(body))
+        if not xml_name:
             return None, "No XML file found"
         
-        xml_url = f"https://www.sec.gov{matches[0]}" if matches[0].startswith('/') else f"{index_url}{matches[0]}"
+        xml_url = f"{index_url}{xml_name}"
         
-        time.sleep(0.12)
-        xml = requests.get(xml_url, headers=HEADERS, timeout=8).text
+        status, xml = fetch_sec(xml_url, immutable=True)
+        if status != 200:
+            return None, f"Information table not found (HTTP {status})"
         
-        holdings = []
-        # Handle both with and without namespace prefixes (ns1:infoTable or infoTable)
-        for table in re.findall(r'<(?:\w+:)?infoTable[^>]*>(.*?)</(?:\w+:)?infoTable>', xml, re.DOTALL | re.IGNORECASE):
-            cm = re.search(r'<(?:\w+:)?cusip>([^<]+)</(?:\w+:)?cusip>', table, re.IGNORECASE)
-            if not cm:
-                continue
-            cusip = cm.group(1).strip()
-            nm = re.search(r'<(?:\w+:)?nameOfIssuer>([^<]+)</(?:\w+:)?nameOfIssuer>', table, re.IGNORECASE)
-            vm = re.search(r'<(?:\w+:)?value>([^<]+)</(?:\w+:)?value>', table, re.IGNORECASE)
-            
-            # Try multiple patterns for shares - they can be nested in different ways
-            sm = None
-            # Pattern 1: Direct sshPrnamt
-            sm = re.search(r'<(?:\w+:)?sshPrnamt>(\d+)</(?:\w+:)?sshPrnamt>', table, re.IGNORECASE)
-            if not sm:
-                # Pattern 2: Inside shrsOrPrnAmt wrapper
-                shares_block = re.search(r'<(?:\w+:)?shrsOrPrnAmt[^>]*>(.*?)</(?:\w+:)?shrsOrPrnAmt>', table, re.DOTALL | re.IGNORECASE)
-                if shares_block:
-                    sm = re.search(r'<(?:\w+:)?sshPrnamt>(\d+)</(?:\w+:)?sshPrnamt>', shares_block.group(1), re.IGNORECASE)
-            
-            pm = re.search(r'<(?:\w+:)?putCall>([^<]+)</(?:\w+:)?putCall>', table, re.IGNORECASE)
-            
-            name = nm.group(1) if nm else ""
-            if pm:
-                name = f"{name} ({pm.group(1).upper()})"
-            
-            # Use new CUSIP lookup system - stores full CUSIP for later resolution
-            holdings.append({
-                "cusip": cusip,  # Store full CUSIP for OpenFIGI lookup
-                "ticker": get_ticker_for_cusip(cusip, name),
-                "name": name,
-                "value": int(vm.group(1)) if vm else 0,
-                "shares": int(sm.group(1)) if sm else 0,
-            })
+        # Columnar accumulation - one dict per holding is only built once the order is final
+        cusips, names, values, shares = [], [], [], []
+        for cusip, name, value, shrs, put_call in parse_infotable(xml):
+            if put_call:
+                name = f"{name} ({put_call.upper()})"
+            cusips.append(cusip)  # Store full CUSIP for OpenFIGI lookup
+            names.append(name)
+            values.append(value)
+            shares.append(shrs)
         
-        if not holdings:
+        if not cusips:
             return None, "No holdings parsed"
         
-        # Resolve any unknown CUSIPs via OpenFIGI API
-        holdings = resolve_unknown_cusips(holdings)
+        tickers = get_tickers_for_cusips(cusips)
+        
+        # Resolve any unknown CUSIPs via OpenFIGI API - a full refresh defers
+        # this and resolves every investor's unknowns together at the end
+        if resolve_cusips:
+            tickers = resolve_unknown_cusips(cusips, tickers)
         
-        total = sum(h["value"] for h in holdings)
-        for h in holdings:
-            h["pct"] = round((h["value"] / total) * 100, 2) if total > 0 else 0
-        holdings.sort(key=lambda x: x["value"], reverse=True)
+        values_arr = np.array(values, dtype=np.int64)
+        total = int(values_arr.sum())
+        pcts = (np.round(values_arr * (100.0 / total), 2) if total > 0 else np.zeros(len(values))).tolist()
+        # Stable argsort keeps equal-value holdings in filing order, like list.sort
+        holdings = [
+            {"cusip": cusips[i], "ticker": tickers[i], "name": names[i], "value": values[i], "shares": shares[i], "pct": pcts[i]}
+            for i in np.argsort(-values_arr, kind="stable").tolist()
+        ]
         
-        return {"cik": cik, "name": info["name"], "firm": info["firm"], "value": total, "filing_date": dates[idx], "holdings": holdings}, None
+        return {"cik": cik, "name": investor_name, "firm": firm, "value": total, "filing_date": filing_date, "accession": accession, "holdings": holdings}, None
     except Exception as e:
         return None, str(e)
 
+def investor_summary(cik: str, detail: dict) -> dict:
+    return {"cik": cik, "name": detail["name"], "firm": detail["firm"], "value": detail["value"], "filing_date": detail["filing_date"]}
+
+def build_investor_summaries() -> list:
+    """Summary rows for /api/superinvestors, largest portfolio first"""
+    return sorted(
+        [investor_summary(k, v) for k, v in CACHE["details"].items()],
+        key=itemgetter("value"), reverse=True
+    )
+
+def _neg_value(row: dict) -> int:
+    return -row["value"]
+
+def upsert_investor_summary(summaries: list, cik: str, detail: dict):
+    """Replace cik's row in a largest-first summary list, inserting it in order (no re-sort)"""
+    for i, row in enumerate(summaries):
+        if row["cik"] == cik:
+            del summaries[i]
+            break
+    insort(summaries, investor_summary(cik, detail), key=_neg_value)
+
 def do_full_refresh():
-    global CACHE
+    """Run a full refresh, or return immediately if one is already in progress"""
+    global _last_refresh_attempt
+    if not _refresh_lock.acquire(blocking=False):
+        print("[Refresh] Already running - skipping")
+        return
+    _last_refresh_attempt = time.monotonic()
+    try:
+        _run_full_refresh()
+    except Exception as e:
+        print(f"[Refresh] Failed: {e}")
+        CACHE["refresh_status"] = "error"
+    finally:
+        _refresh_lock.release()
+
+def _run_full_refresh():
     CACHE["refresh_status"] = "running"
     CACHE["refresh_progress"] = 0
     CACHE["failed"] = []
@@ -412,50 +1025,74 @@ def do_full_refresh():
     
     total = len(SUPERINVESTORS)
     done = 0
+    dirty = 0
+    last_checkpoint = time.monotonic()
+    record_failure = CACHE["failed"].append
+    refreshed = []
+    # Kept sorted as results arrive and published at each checkpoint
+    summaries = list(CACHE["investors"])
     
-    for cik, info in SUPERINVESTORS.items():
-        result, error = scrape_one(cik, info)
-        if result:
-            CACHE["details"][cik] = result
-        else:
-            CACHE["failed"].append({"cik": cik, "name": info["name"], "reason": error})
-        done += 1
-        CACHE["refresh_progress"] = int((done / total) * 100)
-        
-        if done % 10 == 0:
-            CACHE["investors"] = sorted(
-                [{"cik": k, "name": v["name"], "firm": v["firm"], "value": v["value"], "filing_date": v["filing_date"]} 
-                 for k, v in CACHE["details"].items()],
-                key=lambda x: x["value"], reverse=True
-            )
-            save_cache()
+    # Scrapes overlap on network latency while SEC_RATE_LIMITER keeps the
+    # combined request rate under the SEC limit. Results are applied here,
+    # on the refresh thread, so CACHE is only ever written from one thread.
+    with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+        futures = {pool.submit(scrape_one, cik, info, False): (cik, info) for cik, info in SUPERINVESTORS.items()}
+        for future in as_completed(futures):
+            cik, info = futures[future]
+            result, error = future.result()
+            if result:
+                # An unchanged filing comes back as the cached detail itself -
+                # it is already stored and encoded, so there is nothing to write
+                if result is not CACHE["details"].get(cik):
+                    set_investor_detail(cik, result)
+                upsert_investor_summary(summaries, cik, result)
+                refreshed.append(cik)
+            else:
+                record_failure({"cik": cik, "name": info["name"], "reason": error})
+            done += 1
+            dirty += 1
+            CACHE["refresh_progress"] = int((done / total) * 100)
+            
+            # Checkpoint in batches - re-encoding the summary list touches
+            # every cached investor
+            now = time.monotonic()
+            if dirty >= CHECKPOINT_EVERY or now - last_checkpoint >= CHECKPOINT_SECONDS:
+                set_investors(list(summaries))
+                save_cache()
+                dirty = 0
+                last_checkpoint = now
     
-    CACHE["investors"] = sorted(
-        [{"cik": k, "name": v["name"], "firm": v["firm"], "value": v["value"], "filing_date": v["filing_date"]} 
-         for k, v in CACHE["details"].items()],
-        key=lambda x: x["value"], reverse=True
-    )
+    resolve_refreshed_tickers(refreshed)
+    set_investors(summaries)
     CACHE["last_updated"] = datetime.now().isoformat()
     CACHE["refresh_status"] = "complete"
     CACHE["refresh_progress"] = 100
     save_cache()
+    prune_http_cache()
 
-@app.get("/api/refresh")
-def refresh_data(background_tasks: BackgroundTasks):
-    if CACHE.get("refresh_status") == "running":
+@app.get("/api/refresh", status_code=202)
+def refresh_data(background_tasks: BackgroundTasks, response: Response):
+    if not start_refresh(background_tasks):
+        # Nothing was accepted - the running refresh already covers this request
+        response.status_code = 409
         return {
             "status": "already_running",
             "progress": CACHE.get("refresh_progress", 0)
         }
     
-    background_tasks.add_task(do_full_refresh)
-    
     return {
         "status": "started",
         "message": "Refresh started in background. Check /api/status for progress.",
         "total_investors": len(SUPERINVESTORS)
     }
 
+@app.get("/api/refresh/status")
+def get_refresh_status():
+    return {
+        "running": _refresh_lock.locked(),
+        "last_updated": CACHE.get("last_updated")
+    }
+
 @app.get("/api/scheduler")
 def get_scheduler_status():
     jobs = scheduler.get_jobs()
@@ -486,18 +1123,19 @@ def get_cusip_cache():
 @app.get("/api/cusip/lookup/{cusip}")
 def lookup_single_cusip(cusip: str):
     """Look up a single CUSIP and cache the result"""
+    cusip = normalize_cusip(cusip)
     # Check cache first
-    if cusip in CUSIP_CACHE:
-        return {"source": "cache", "cusip": cusip, "data": CUSIP_CACHE[cusip]}
-    if cusip[:6] in CUSIP_CACHE:
-        return {"source": "cache", "cusip": cusip, "data": CUSIP_CACHE[cusip[:6]]}
-    if cusip[:6] in CUSIP_TO_TICKER:
-        return {"source": "hardcoded", "cusip": cusip, "ticker": CUSIP_TO_TICKER[cusip[:6]]}
+    ticker = CUSIP_CACHE.get(cusip)
+    if ticker:
+        return {"source": "cache", "cusip": cusip, "data": {"ticker": ticker, "name": CUSIP_NAMES.get(cusip, "")}}
+    ticker = CUSIP_TO_TICKER.get(cusip[:6])
+    if ticker:
+        return {"source": "hardcoded", "cusip": cusip, "ticker": ticker}
     
     # Look up via OpenFIGI
     results = lookup_cusips_openfigi([cusip])
     if results:
-        return {"source": "openfigi", "cusip": cusip, "data": results.get(cusip) or results.get(cusip[:6])}
+        return {"source": "openfigi", "cusip": cusip, "data": results.get(cusip)}
     
     return {"source": "not_found", "cusip": cusip, "data": None}
 
@@ -520,10 +1158,10 @@ def debug_refresh_one(cik: str):
         return {"error": "CIK not in SUPERINVESTORS list"}
     
     info = SUPERINVESTORS[cik]
-    result, error = scrape_one(cik, info)
+    result, error = scrape_one(cik, info, force=True)
     
     if result:
-        CACHE["details"][cik] = result
+        set_investor_detail(cik, result)
         save_cache()
         return {
             "success": True,
@@ -542,63 +1180,56 @@ def debug_scrape(cik: str):
     info = SUPERINVESTORS[cik]
     try:
         cik_padded = cik.zfill(10)
-        r = requests.get(f"https://data.sec.gov/submissions/CIK{cik_padded}.json", headers=HEADERS, timeout=8)
-        if r.status_code != 200:
-            return {"error": f"CIK lookup failed: {r.status_code}"}
-        data = r.json()
-        recent = data.get("filings", {}).get("recent", {})
-        forms = recent.get("form", [])
-        accessions = recent.get("accessionNumber", [])
-        
-        idx = next((i for i, f in enumerate(forms) if f in ["13F-HR", "13F-HR/A"]), None)
-        if idx is None:
+        status, body = fetch_sec(f"https://data.sec.gov/submissions/CIK{cik_padded}.json")
+        if status != 200:
+            return {"error": f"CIK lookup failed: {status}"}
+        latest = find_latest_13f(orjson.loads(body))
+        if latest is None:
             return {"error": "No 13F-HR filing found"}
         
-        acc = accessions[idx].replace("-", "")
+        acc = latest[0].replace("-", "")
         index_url = f"https://www.sec.gov/Archives/edgar/data/{cik}/{acc}/"
         
-        r = requests.get(index_url, headers=HEADERS, timeout=8)
-        matches = re.findall(r'href="([^"]*infotable[^"]*\.xml)"', r.text, re.IGNORECASE)
-        if not matches:
-            matches = [x for x in re.findall(r'href="([^"]+\.xml)"', r.text, re.IGNORECASE) if 'primary_doc' not in x.lower()]
+        status, body = fetch_sec(f"{index_url}index.json", immutable=True)
+        if status != 200:
+            return {"error": f"Filing index lookup failed: {status}", "index_url": index_url}
+        xml_name = find_infotable_xml(orjson.loads(body))
         
-        if not matches:
+        if not xml_name:
             return {"error": "No XML file found", "index_url": index_url}
         
-        xml_url = f"https://www.sec.gov{matches[0]}" if matches[0].startswith('/') else f"{index_url}{matches[0]}"
-        xml = requests.get(xml_url, headers=HEADERS, timeout=8).text
+        xml_url = f"{index_url}{xml_name}"
+        status, xml = fetch_sec(xml_url, immutable=True)
+        if status != 200:
+            return {"error": f"Information table fetch failed: {status}", "xml_url": xml_url}
         
-        # Count raw infoTable entries
-        info_tables = re.findall(r'<(?:\w+:)?infoTable[^>]*>(.*?)</(?:\w+:)?infoTable>', xml, re.DOTALL | re.IGNORECASE)
+        # Stream every infoTable entry, falling back to the regex parser for malformed XML
+        try:
+            rows = list(iter_infotable(xml))
+            parser = XML_PARSER
+        except XMLSyntaxError as e:
+            rows = parse_infotable_regex(xml)
+            parser = f"regex ({e})"
         
-        # Parse each one and show what we get
-        parsed = []
-        for i, table in enumerate(info_tables):
-            cm = re.search(r'<(?:\w+:)?cusip>([^<]+)</(?:\w+:)?cusip>', table, re.IGNORECASE)
-            nm = re.search(r'<(?:\w+:)?nameOfIssuer>([^<]+)</(?:\w+:)?nameOfIssuer>', table, re.IGNORECASE)
-            vm = re.search(r'<(?:\w+:)?value>([^<]+)</(?:\w+:)?value>', table, re.IGNORECASE)
-            
-            # Try multiple patterns for shares
-            sm = re.search(r'<(?:\w+:)?sshPrnamt>(\d+)</(?:\w+:)?sshPrnamt>', table, re.IGNORECASE)
-            if not sm:
-                shares_block = re.search(r'<(?:\w+:)?shrsOrPrnAmt[^>]*>(.*?)</(?:\w+:)?shrsOrPrnAmt>', table, re.DOTALL | re.IGNORECASE)
-                if shares_block:
-                    sm = re.search(r'<(?:\w+:)?sshPrnamt>(\d+)</(?:\w+:)?sshPrnamt>', shares_block.group(1), re.IGNORECASE)
-            
-            parsed.append({
+        parsed = [
+            {
                 "index": i,
-                "has_cusip": cm is not None,
-                "cusip": cm.group(1) if cm else None,
-                "name": nm.group(1) if nm else None,
-                "value": vm.group(1) if vm else None,
-                "shares": sm.group(1) if sm else None,
-            })
+                "has_cusip": cusip is not None,
+                "cusip": cusip,
+                "name": name,
+                "value": value,
+                "shares": shares,
+                "put_call": put_call,
+            }
+            for i, (cusip, name, value, shares, put_call) in enumerate(rows)
+        ]
         
         return {
             "cik": cik,
             "name": info["name"],
             "xml_url": xml_url,
-            "info_table_count": len(info_tables),
+            "parser": parser,
+            "info_table_count": len(rows),
             "parsed_count": len([p for p in parsed if p["has_cusip"]]),
             "parsed_details": parsed
         }
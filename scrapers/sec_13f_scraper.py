@@ -9,15 +9,21 @@ UPDATED: All 77 superinvestors with verified CIK numbers for 100% accuracy.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 import json
+import threading
 import time
-import re
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
+from io import BytesIO
 from pathlib import Path
 import logging
+import numpy as np
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,10 +37,49 @@ SEC_EDGAR_ARCHIVES = "https://www.sec.gov/cgi-bin/browse-edgar"
 # Required headers for SEC EDGAR (they require user-agent identification)
 HEADERS = {
     "User-Agent": "InvestorInsight Research Bot (contact@investorinsight.com)",
-    "Accept-Encoding": "gzip, deflate",
+    # gzip/deflate, plus br when the brotli package is installed - only
+    # encodings urllib3 can actually decode are advertised
+    "Accept-Encoding": DEFAULT_ACCEPT_ENCODING,
     "Accept": "application/json, text/html, application/xml"
 }
 
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    
+    Holds up to `capacity` tokens, refilled continuously at `rate` tokens per
+    second. acquire() only sleeps when the bucket is empty, so time already
+    spent waiting on the network counts towards the next request.
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Take one token, sleeping until it is available"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # Reserve the token up front; a negative balance queues later callers
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+# SEC EDGAR allows max 10 requests per second. capacity + rate <= 10 keeps
+# every one-second window under the limit, bursts included.
+SEC_RATE_LIMITER = TokenBucket(rate=8, capacity=2)
+
+# Concurrent investor fetches in get_all_latest_filings
+MAX_WORKERS = 8
+
 # =============================================================================
 # CUSIP TO TICKER MAPPING (exported for app.py)
 # =============================================================================
@@ -518,9 +563,9 @@ SUPERINVESTORS = {
 }
 
 
-@dataclass
+@dataclass(slots=True)
 class Holding:
-    """Represents a single stock holding from a 13F filing"""
+    """Represents a single stock holding from a 13F filing (slotted - filings run to thousands of rows)"""
     cusip: str
     issuer_name: str
     class_title: str
@@ -568,6 +613,7 @@ class SEC13FScraper:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.cusip_to_ticker = self._load_cusip_mapping()
+        self.session = self._create_session()
         
     def _load_cusip_mapping(self) -> Dict[str, str]:
         """
@@ -601,9 +647,24 @@ class SEC13FScraper:
             "30231G": "XOM",    # Exxon Mobil
         }
     
+    def _create_session(self) -> requests.Session:
+        """
+        Pooled session shared by all requests (and worker threads) so
+        repeat calls to sec.gov reuse a kept-alive TLS connection.
+        Transient 429/5xx responses are retried with backoff.
+        """
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=MAX_WORKERS,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False),
+        ))
+        return session
+    
     def _rate_limit(self):
         """SEC EDGAR requires max 10 requests per second"""
-        time.sleep(0.15)
+        SEC_RATE_LIMITER.acquire()
     
     def get_cik_filings(self, cik: str, filing_type: str = "13F-HR") -> List[Dict]:
         """
@@ -623,7 +684,7 @@ class SEC13FScraper:
         
         try:
             self._rate_limit()
-            response = requests.get(url, headers=HEADERS)
+            response = self.session.get(url, timeout=8)
             response.raise_for_status()
             data = response.json()
             
@@ -682,9 +743,9 @@ class SEC13FScraper:
             url = f"{base_url}/{xml_name}"
             try:
                 self._rate_limit()
-                response = requests.get(url, headers=HEADERS)
+                response = self.session.get(url, timeout=8)
                 if response.status_code == 200:
-                    return self._parse_13f_xml(response.text)
+                    return self._parse_13f_xml(response.content)
             except requests.exceptions.RequestException:
                 continue
         
@@ -692,7 +753,7 @@ class SEC13FScraper:
         try:
             index_url = f"{base_url}/index.json"
             self._rate_limit()
-            response = requests.get(index_url, headers=HEADERS)
+            response = self.session.get(index_url, timeout=8)
             if response.status_code == 200:
                 index_data = response.json()
                 for item in index_data.get("directory", {}).get("item", []):
@@ -700,9 +761,9 @@ class SEC13FScraper:
                     if "infotable" in name.lower() or name.endswith(".xml"):
                         xml_url = f"{base_url}/{name}"
                         self._rate_limit()
-                        xml_response = requests.get(xml_url, headers=HEADERS)
+                        xml_response = self.session.get(xml_url, timeout=8)
                         if xml_response.status_code == 200:
-                            holdings = self._parse_13f_xml(xml_response.text)
+                            holdings = self._parse_13f_xml(xml_response.content)
                             if holdings:
                                 return holdings
         except Exception as e:
@@ -710,61 +771,40 @@ class SEC13FScraper:
         
         return None
     
-    def _parse_13f_xml(self, xml_content: str) -> Optional[List[Holding]]:
+    def _parse_13f_xml(self, xml_content: bytes) -> Optional[List[Holding]]:
         """
         Parse 13F XML information table.
         
         Args:
-            xml_content: Raw XML string
+            xml_content: Raw XML bytes as downloaded - the parser reads the
+                declared encoding itself, so the body is never decoded to str
             
         Returns:
             List of Holding objects or None if parsing fails
         """
+        # {*} matches the tag in any namespace (or none), so the default
+        # informationtable namespace, ns1: prefixes and bare tags all resolve
+        def get_text(parent, tag, default=""):
+            return parent.findtext(f'{{*}}{tag}') or default
+        
+        def get_int(parent, tag, default=0):
+            text = get_text(parent, tag)
+            return int(text) if text else default
+        
+        def is_info_table(tag):
+            return tag == 'infoTable' or tag.endswith('}infoTable')
+        
         try:
-            # Remove XML declaration and fix namespace issues
-            xml_content = re.sub(r'<\?xml[^>]*\?>', '', xml_content)
-            
-            # Handle different namespace patterns
-            # Try with namespace
-            namespaces = {
-                'ns': 'http://www.sec.gov/edgar/document/thirteenf/informationtable',
-                '': 'http://www.sec.gov/edgar/document/thirteenf/informationtable'
-            }
-            
-            root = ET.fromstring(xml_content)
             holdings = []
             
-            # Try different tag patterns
-            info_tables = (
-                root.findall('.//ns:infoTable', namespaces) or
-                root.findall('.//{http://www.sec.gov/edgar/document/thirteenf/informationtable}infoTable') or
-                root.findall('.//infoTable') or
-                root.findall('.//*[local-name()="infoTable"]')
-            )
-            
-            for table in info_tables:
+            # Stream the document and handle each infoTable as it closes, so
+            # the full tree of a large filing is never held in memory
+            for _, table in ET.iterparse(BytesIO(xml_content)):
+                if not is_info_table(table.tag):
+                    continue
                 try:
-                    # Helper to get text from element with namespace handling
-                    def get_text(parent, tag, default=""):
-                        elem = (
-                            parent.find(f'ns:{tag}', namespaces) or
-                            parent.find(f'{{http://www.sec.gov/edgar/document/thirteenf/informationtable}}{tag}') or
-                            parent.find(tag) or
-                            parent.find(f'.//*[local-name()="{tag}"]')
-                        )
-                        return elem.text if elem is not None and elem.text else default
-                    
-                    def get_int(parent, tag, default=0):
-                        text = get_text(parent, tag)
-                        return int(text) if text else default
-                    
                     # Get shrsOrPrnAmt sub-elements
-                    shrs_elem = (
-                        table.find('ns:shrsOrPrnAmt', namespaces) or
-                        table.find('{http://www.sec.gov/edgar/document/thirteenf/informationtable}shrsOrPrnAmt') or
-                        table.find('shrsOrPrnAmt') or
-                        table.find('.//*[local-name()="shrsOrPrnAmt"]')
-                    )
+                    shrs_elem = table.find('{*}shrsOrPrnAmt')
                     
                     shares = 0
                     share_type = "SH"
@@ -773,12 +813,7 @@ class SEC13FScraper:
                         share_type = get_text(shrs_elem, 'sshPrnamtType', 'SH')
                     
                     # Get voting authority sub-elements
-                    voting_elem = (
-                        table.find('ns:votingAuthority', namespaces) or
-                        table.find('{http://www.sec.gov/edgar/document/thirteenf/informationtable}votingAuthority') or
-                        table.find('votingAuthority') or
-                        table.find('.//*[local-name()="votingAuthority"]')
-                    )
+                    voting_elem = table.find('{*}votingAuthority')
                     
                     voting_sole = voting_shared = voting_none = 0
                     if voting_elem is not None:
@@ -805,7 +840,8 @@ class SEC13FScraper:
                     
                 except Exception as e:
                     logger.warning(f"Error parsing holding entry: {e}")
-                    continue
+                finally:
+                    table.clear()
             
             return holdings if holdings else None
             
@@ -842,13 +878,15 @@ class SEC13FScraper:
             logger.warning(f"Could not parse holdings for {investor['name']}")
             return None
         
-        # Calculate total value and percentages
-        total_value = sum(h.value for h in holdings)
-        for h in holdings:
-            h.pct_portfolio = (h.value / total_value * 100) if total_value > 0 else 0
+        # Calculate total value and percentages in one pass over a values array
+        values = np.fromiter((h.value for h in holdings), dtype=np.int64, count=len(holdings))
+        total_value = int(values.sum())
+        pcts = values * (100.0 / total_value) if total_value > 0 else np.zeros(len(holdings))
+        for h, pct in zip(holdings, pcts.tolist()):
+            h.pct_portfolio = pct
         
-        # Sort by value descending
-        holdings.sort(key=lambda x: x.value, reverse=True)
+        # Sort by value descending (stable, so ties keep filing order)
+        holdings = [holdings[i] for i in np.argsort(-values, kind="stable").tolist()]
         
         return Filing13F(
             cik=cik,
@@ -894,14 +932,17 @@ class SEC13FScraper:
         Returns:
             Dict mapping investor key to Filing13F
         """
-        results = {}
-        
-        for investor_key in SUPERINVESTORS:
+        def fetch(investor_key: str) -> Optional[Filing13F]:
             logger.info(f"Fetching {SUPERINVESTORS[investor_key]['name']}...")
-            filing = self.get_latest_filing(investor_key)
-            if filing:
-                results[investor_key] = filing
-            time.sleep(0.1)  # Extra rate limiting
+            return self.get_latest_filing(investor_key)
+        
+        # Investors are fetched concurrently; SEC_RATE_LIMITER is shared by
+        # every thread, so the combined rate stays under the SEC limit
+        results = {}
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            for investor_key, filing in zip(SUPERINVESTORS, pool.map(fetch, SUPERINVESTORS)):
+                if filing:
+                    results[investor_key] = filing
         
         return results
     